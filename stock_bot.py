@@ -12,24 +12,52 @@ import sys
 import os
 import time
 import logging
+import logging.handlers
+import queue
+import atexit
 import requests
-import subprocess
+import httpx
 import asyncio
-from datetime import datetime
+import functools
+from datetime import datetime, timedelta
 from pathlib import Path
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
+from telegram.error import RetryAfter
 from telegram.ext import Application, CommandHandler, CallbackQueryHandler, ContextTypes
 
-# 로깅 설정
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler('stock_bot.log', encoding='utf-8'),
-        logging.StreamHandler()
-    ]
-)
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import uvloop
+except ImportError:
+    uvloop = None
+
+# 로깅 설정 (파일/콘솔 쓰기는 별도 스레드에서 처리해 이벤트 루프를 막지 않음)
+_LOG_QUEUE = queue.Queue(-1)
+_log_formatter = logging.Formatter('%(asctime)s - %(levelname)s - %(message)s')
+_log_handlers = [
+    logging.handlers.RotatingFileHandler(
+        'stock_bot.log', maxBytes=5_000_000, backupCount=3, encoding='utf-8'
+    ),
+    logging.StreamHandler()
+]
+for _handler in _log_handlers:
+    _handler.setFormatter(_log_formatter)
+_LOG_LISTENER = logging.handlers.QueueListener(_LOG_QUEUE, *_log_handlers)
+_LOG_LISTENER.start()
+# 종료 시 큐에 남은 로그까지 기록
+atexit.register(_LOG_LISTENER.stop)
+# 큐에는 메시지(+예외 정보)만 넣고 최종 포맷은 파일/콘솔 핸들러에서 적용
+_queue_handler = logging.handlers.QueueHandler(_LOG_QUEUE)
+_queue_handler.setFormatter(logging.Formatter('%(message)s'))
+logging.basicConfig(level=logging.INFO, handlers=[_queue_handler])
 logger = logging.getLogger(__name__)
+logging.getLogger('httpx').setLevel(logging.WARNING)
 
 # 설정 파일 경로
 CONFIG_PATH = Path(__file__).parent / 'config.json'
@@ -39,6 +67,9 @@ STATE_PATH = Path(__file__).parent / 'state.json'
 STOCK_CODE = '099190'
 STOCK_NAME = '아이센스'
 
+# 관리자 채팅 ID (봇 시작 시 config.json에서 설정)
+ADMIN_ID = None
+
 # 기본 설정
 DEFAULT_THRESHOLD = 2
 DEFAULT_ENABLED = True
@@ -49,28 +80,241 @@ TIME_SLOTS = [
     '12:30', '13:00', '13:30', '14:00', '14:30', '15:00'
 ]
 
+# 시간대별 슬롯과 (시, 분) - 모니터링 때마다 문자열을 파싱하지 않도록 미리 변환
+TIME_SLOT_TIMES = [(slot, tuple(map(int, slot.split(':')))) for slot in TIME_SLOTS]
+
+# 종가 알림 시각 - 15:30 동시호가 체결가가 반영된 뒤에 조회
+# 네이버가 아직 장중(OPEN)으로 주면 다음 조회에서 다시 확인하고,
+# CLOSE_ALERT_DEADLINE까지 반영되지 않으면 그때의 가격으로 보냄
+CLOSE_ALERT_TIME = (15, 31)
+CLOSE_ALERT_DEADLINE = (15, 45)
+
+# 정시 알림 시각 (시작가 09:05, 시간대별 슬롯, 종가)
+ALERT_TIMES = [(9, 5)] + [slot_time for _, slot_time in TIME_SLOT_TIMES] + [CLOSE_ALERT_TIME]
+
+# 알림 메시지 템플릿 (모듈 로드 시 한 번만 구성)
+OPEN_ALERT_TEMPLATE = f"""📊 <b>{STOCK_NAME} 장 시작</b>
+
+🔔 시작가: {{open_price:,}}원
+📈 전일대비: {{arrow}} {{change:+.2f}}%
+⏰ {{now:%Y-%m-%d %H:%M}}"""
+
+TIME_ALERT_TEMPLATE = f"""🕐 <b>{STOCK_NAME} {{slot}} 현재가</b>
+
+💰 현재가: {{current_price:,}}원
+{{arrow}} 시가대비: {{change_from_open:+.2f}}%
+
+📊 시가: {{open_price:,}}원
+📈 고가: {{high:,}}원
+📉 저가: {{low:,}}원
+
+⏰ {{now:%H:%M}}"""
+
+# 변동 알림: 사용자마다 다른 부분만 VARIATION_ALERT_TEMPLATE로 채우고
+# 같은 틱의 공통 부분(VARIATION_COMMON_TEMPLATE)은 한 번만 만듦
+VARIATION_ALERT_TEMPLATE = f"""{{emoji}} <b>{STOCK_NAME} {{change:.1f}}% {{direction}}!</b>
+
+{{common}}
+📍 내 알림기준: {{last_alert_price:,}}원
+⏰ {{time}}"""
+
+VARIATION_COMMON_TEMPLATE = """💰 현재가: {current_price:,}원
+📊 시가대비: {change_from_open:+.2f}%"""
+
+CLOSE_ALERT_TEMPLATE = f"""🔔 <b>{STOCK_NAME} 장 마감</b>
+
+💰 종가: {{current_price:,}}원
+{{result_emoji}} 등락: {{result_text}} {{change:.2f}}%
+
+📊 시가: {{open_price:,}}원
+📈 고가: {{high:,}}원
+📉 저가: {{low:,}}원
+
+⏰ {{now:%Y-%m-%d %H:%M}}"""
+
+PRICE_TEMPLATE = f"""💰 <b>{STOCK_NAME} 현재가</b>
+
+<b>{{current:,}}원</b> {{arrow}} {{change_rate:+.2f}}%
+
+📊 시가: {{open:,}}원
+📈 고가: {{high:,}}원
+📉 저가: {{low:,}}원
+📅 전일: {{prev_close:,}}원
+📦 거래량: {{volume}}
+
+⏰ {{timestamp}}"""
+
+# 호가 화면 구분선
+_SEP = "─" * 20
+
+USER_AGENT = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
+
+# HTTP 세션 (keep-alive로 TCP/TLS 연결 재사용)
+_SESSION = requests.Session()
+_ADAPTER = HTTPAdapter(
+    pool_connections=4,
+    pool_maxsize=10,
+    max_retries=Retry(
+        total=3,
+        backoff_factor=0.5,
+        status_forcelist=[500, 502, 503, 504],
+        # POST(sendMessage)는 이미 전송된 뒤 재시도하면 중복 전송될 수 있어 GET만 재시도
+        allowed_methods={'GET'}
+    )
+)
+_SESSION.mount('https://', _ADAPTER)
+_SESSION.headers.update({
+    'User-Agent': USER_AGENT,
+    'Connection': 'keep-alive',
+})
+atexit.register(_SESSION.close)
+
+# 비동기 HTTP 클라이언트 (봇 이벤트 루프를 막지 않도록 네이버 API에 사용)
+_HTTP = httpx.AsyncClient(
+    headers={
+        'User-Agent': USER_AGENT,
+        'Accept': 'application/json',
+        'Accept-Encoding': 'gzip, deflate',
+    },
+    timeout=10,
+    limits=httpx.Limits(max_connections=4, max_keepalive_connections=4, keepalive_expiry=75),
+)
+
+# 텔레그램 동시 전송 수 제한 (동시에 진행 중인 요청 수만 제한하며 초당 전송 수는
+# 제한하지 않음 - 초당 30건 제한에 걸리면 send_to_user가 RetryAfter 후 재시도)
+_SEND_SEMAPHORE = asyncio.Semaphore(25)
+
+# 설정되면 main()이 봇을 정리하고 종료 (/restart에서 사용)
+_SHUTDOWN = asyncio.Event()
+
+# 주가 캐시 유지 시간(초) - 그 사이 요청은 같은 조회 결과를 공유
+PRICE_CACHE_TTL = 5
+
+# 알림 기준가로 쓸 수 있는 캐시된 현재가의 최대 나이(초) - 모니터링 주기 한 번
+SEED_PRICE_MAX_AGE = 60
+
+# 종목별 주가/호가 캐시 {종목코드: (조회 시작 시각, 조회 Task)}
+_PRICE_CACHE = {}
+_ORDERBOOK_CACHE = {}
+
+# 재시도할 일시적 서버 오류 코드
+RETRY_STATUSES = {500, 502, 503, 504}
+
+# 설정 파일 캐시 (mtime이 바뀔 때만 다시 읽음)
+_CONFIG_CACHE = {'mtime': None, 'data': None}
+
+# 상태 파일 캐시 (mtime이 바뀔 때만 다시 읽고, 내용이 같으면 다시 쓰지 않음)
+_STATE_CACHE = {'mtime': None, 'data': None, 'raw': None}
+
+# 초 단위 현재 시각 문자열 캐시
+_TS_CACHE = {'sec': None, 'str': ''}
+
+# 버튼 연타 시 상태 파일 쓰기를 모으는 지연 시간(초)과 예약된 저장
+SAVE_DELAY = 0.5
+_PENDING_SAVE = {'handle': None}
+
 
 def load_config():
     """설정 파일 로드"""
-    if not CONFIG_PATH.exists():
-        logger.error(f"설정 파일이 없습니다: {CONFIG_PATH}")
+    try:
+        mtime = CONFIG_PATH.stat().st_mtime_ns
+    except FileNotFoundError:
+        logger.error("설정 파일이 없습니다: %s", CONFIG_PATH)
         sys.exit(1)
-    with open(CONFIG_PATH, 'r', encoding='utf-8') as f:
-        return json.load(f)
+    if _CONFIG_CACHE['mtime'] == mtime:
+        return _CONFIG_CACHE['data']
+    config = _loads(CONFIG_PATH.read_bytes())
+    _CONFIG_CACHE['mtime'] = mtime
+    _CONFIG_CACHE['data'] = config
+    return config
+
+
+def _dumps(obj):
+    """JSON 직렬화 (orjson 설치 시 사용)"""
+    if orjson:
+        # OPT_NON_STR_KEYS: json 모듈처럼 숫자 키도 문자열로 저장
+        return orjson.dumps(obj, option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS)
+    return json.dumps(obj, ensure_ascii=False, indent=2).encode('utf-8')
+
+
+# JSON 파싱 (orjson 설치 시 사용, bytes/str 모두 받음)
+_loads = orjson.loads if orjson else json.loads
 
 
 def load_state():
-    """상태 파일 로드"""
-    if STATE_PATH.exists():
-        with open(STATE_PATH, 'r', encoding='utf-8') as f:
-            return json.load(f)
-    return {'users': {}}
+    """상태 파일 로드 (파일이 바뀌지 않았으면 캐시된 객체 반환)"""
+    try:
+        mtime = STATE_PATH.stat().st_mtime_ns
+    except FileNotFoundError:
+        # 아직 저장 전인 변경 사항이 있을 수 있으므로 기본 상태도 캐시에 보관
+        if _STATE_CACHE['data'] is None:
+            _STATE_CACHE['data'] = {'users': {}}
+        return _STATE_CACHE['data']
+    if _STATE_CACHE['mtime'] == mtime:
+        return _STATE_CACHE['data']
+    raw = STATE_PATH.read_bytes()
+    state = _loads(raw) if raw else {'users': {}}
+    _migrate_legacy_phase(state)
+    _STATE_CACHE.update(mtime=mtime, data=state, raw=raw)
+    return state
+
+
+def _migrate_legacy_phase(state):
+    """이전 버전의 sent_open_alert/sent_close_alert 플래그를 phase로 변환
+
+    배포/재시작 당일 이미 보낸 시작가/종가 알림을 다시 보내지 않도록 함
+    (변환한 상태는 다음 저장 때 파일에 반영됨)
+    """
+    if 'sent_open_alert' not in state and 'sent_close_alert' not in state:
+        return
+    sent_open = state.pop('sent_open_alert', False)
+    sent_close = state.pop('sent_close_alert', False)
+    if 'phase' not in state:
+        if sent_close:
+            state['phase'] = 'closed'
+        elif sent_open:
+            state['phase'] = 'intraday'
 
 
 def save_state(state):
-    """상태 파일 저장"""
-    with open(STATE_PATH, 'w', encoding='utf-8') as f:
-        json.dump(state, f, ensure_ascii=False, indent=2)
+    """상태 파일 저장 (임시 파일에 쓰고 fsync 후 교체)"""
+    # 지금 전체를 저장하므로 예약된 지연 저장은 필요 없음
+    if _PENDING_SAVE['handle']:
+        _PENDING_SAVE['handle'].cancel()
+        _PENDING_SAVE['handle'] = None
+    raw = _dumps(state)
+    if raw == _STATE_CACHE['raw']:
+        _STATE_CACHE['data'] = state
+        return
+    tmp_path = STATE_PATH.with_suffix('.tmp')
+    with open(tmp_path, 'wb') as f:
+        f.write(raw)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, STATE_PATH)
+    _STATE_CACHE.update(mtime=STATE_PATH.stat().st_mtime_ns, data=state, raw=raw)
+
+
+def schedule_save_state(state):
+    """SAVE_DELAY초 뒤 상태 파일 저장 (그 사이의 변경은 한 번에 저장)"""
+    try:
+        loop = asyncio.get_running_loop()
+    except RuntimeError:
+        save_state(state)
+        return
+    if _PENDING_SAVE['handle']:
+        _PENDING_SAVE['handle'].cancel()
+    _PENDING_SAVE['handle'] = loop.call_later(SAVE_DELAY, flush_state, state)
+
+
+def flush_state(state=None):
+    """예약된 상태 저장을 바로 실행"""
+    handle = _PENDING_SAVE['handle']
+    if handle is None:
+        return
+    handle.cancel()
+    _PENDING_SAVE['handle'] = None
+    save_state(state if state is not None else load_state())
 
 
 def get_user_settings(chat_id):
@@ -86,7 +330,7 @@ def set_user_settings(chat_id, settings):
     if 'users' not in state:
         state['users'] = {}
     state['users'][str(chat_id)] = settings
-    save_state(state)
+    schedule_save_state(state)
 
 
 def remove_user(chat_id):
@@ -94,6 +338,15 @@ def remove_user(chat_id):
     state = load_state()
     if 'users' in state and str(chat_id) in state['users']:
         del state['users'][str(chat_id)]
+        schedule_save_state(state)
+
+
+def ensure_admin_user(admin_id):
+    """관리자를 사용자 목록에 등록 (관리자는 항상 알림 대상)"""
+    state = load_state()
+    users = state.setdefault('users', {})
+    if admin_id not in users:
+        users[admin_id] = {'enabled': True, 'threshold': DEFAULT_THRESHOLD}
         save_state(state)
 
 
@@ -103,38 +356,158 @@ def get_all_users():
     return state.get('users', {})
 
 
-def format_price(price):
-    """가격 포맷팅"""
-    return f"{price:,}"
+# 가격 포맷팅 (천 단위 콤마, 바운드 메서드라 함수 호출 한 단계가 줄어듦)
+format_price = '{:,}'.format
 
 
-def get_stock_price():
-    """네이버 금융에서 주가 정보 가져오기"""
+# 숫자 문자열에서 콤마 제거용 변환 테이블
+_DEL_COMMA = str.maketrans('', '', ',')
+
+
+def _num(value, cls=int):
+    """네이버 API 숫자 필드 변환 (콤마 포함 문자열 또는 숫자, 비어 있으면 0)"""
+    if not value:
+        return cls()
+    if isinstance(value, str):
+        return cls(value.translate(_DEL_COMMA))
+    return cls(value)
+
+
+def now_str():
+    """현재 시각 문자열 (YYYY-MM-DD HH:MM:SS, 같은 초 안에서는 재사용)"""
+    sec = int(time.time())
+    if _TS_CACHE['sec'] != sec:
+        _TS_CACHE['sec'] = sec
+        _TS_CACHE['str'] = datetime.fromtimestamp(sec).isoformat(' ')
+    return _TS_CACHE['str']
+
+
+def is_monitoring_time(now=None):
+    """모니터링 시간 여부 (평일 09:00 ~ 16:00)
+
+    장은 15:30에 끝나지만 종가 알림 조회가 실패해도 다시 시도할 수 있도록
+    16:00까지 둠 (종가 알림을 보내면 price_monitor가 그날 조회를 멈춤)
+    """
+    now = now or datetime.now()
+    if now.weekday() >= 5:
+        return False
+    return 9 <= now.hour < 16
+
+
+def seconds_until_next_alert(now):
+    """오늘 남은 다음 정시 알림까지 남은 시간(초), 없으면 None"""
+    for hour, minute in ALERT_TIMES:
+        target = now.replace(hour=hour, minute=minute, second=0, microsecond=0)
+        if target > now:
+            return (target - now).total_seconds()
+    return None
+
+
+def seconds_until_market_open(now):
+    """다음 장 시작(평일 09:00)까지 남은 시간(초)"""
+    target = now.replace(hour=9, minute=0, second=0, microsecond=0)
+    if target <= now:
+        target += timedelta(days=1)
+    while target.weekday() >= 5:
+        target += timedelta(days=1)
+    return (target - now).total_seconds()
+
+
+@functools.lru_cache(maxsize=None)
+def naver_api_url(code, endpoint):
+    """네이버 금융 API 주소 (종목/엔드포인트별로 한 번만 생성)"""
+    return f"https://m.stock.naver.com/api/stock/{code}/{endpoint}"
+
+
+async def _get_json(url, retries=3, backoff=0.5):
+    """GET 요청 후 JSON 반환 (연결 오류/5xx는 지수 백오프로 재시도)"""
+    for attempt in range(retries + 1):
+        try:
+            response = await _HTTP.get(url)
+            if response.status_code not in RETRY_STATUSES or attempt == retries:
+                response.raise_for_status()
+                return _loads(response.content)
+        except httpx.TransportError:
+            if attempt == retries:
+                raise
+        await asyncio.sleep(backoff * 2 ** attempt)
+
+
+async def _gather_or_cancel(*aws):
+    """동시에 실행해 결과 목록 반환 (하나가 실패하면 나머지는 재시도까지 가지 않도록 취소)"""
+    tasks = [asyncio.ensure_future(aw) for aw in aws]
     try:
-        headers = {'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'}
+        return await asyncio.gather(*tasks)
+    except BaseException:
+        for task in tasks:
+            task.cancel()
+        raise
 
-        # 기본 정보 API
-        basic_url = f"https://m.stock.naver.com/api/stock/{STOCK_CODE}/basic"
-        basic_resp = requests.get(basic_url, headers=headers, timeout=10)
-        basic_resp.raise_for_status()
-        basic_data = basic_resp.json()
 
-        current_price = int(basic_data.get('closePrice', '0').replace(',', ''))
-        prev_diff = int(basic_data.get('compareToPreviousClosePrice', '0').replace(',', ''))
-        prev_close = current_price - prev_diff
-        change_rate = float(basic_data.get('fluctuationsRatio', '0'))
+async def _cached_fetch(cache, code, fetch):
+    """PRICE_CACHE_TTL초 이내 조회는 진행 중인 요청까지 공유"""
+    now = time.monotonic()
+    cached = cache.get(code)
+    if cached and now - cached[0] < PRICE_CACHE_TTL:
+        return await asyncio.shield(cached[1])
+
+    task = asyncio.ensure_future(fetch(code))
+    cache[code] = (now, task)
 
-        # 통합 정보 API (시가, 고가, 저가, 거래량)
-        integration_url = f"https://m.stock.naver.com/api/stock/{STOCK_CODE}/integration"
-        integ_resp = requests.get(integration_url, headers=headers, timeout=10)
-        integ_resp.raise_for_status()
-        integ_data = integ_resp.json()
+    def evict_failed(done):
+        # 실패한 결과(None, 예외, 취소)는 캐시하지 않음 - 기다리던 호출자가 취소돼도 적용
+        if cache.get(code, (None, None))[1] is not done:
+            return
+        if done.cancelled() or done.exception() is not None or done.result() is None:
+            del cache[code]
+
+    task.add_done_callback(evict_failed)
+    return await asyncio.shield(task)
+
+
+async def get_stock_price(code=STOCK_CODE):
+    """주가 정보 (짧은 시간 내 중복 조회는 캐시 공유)"""
+    return await _cached_fetch(_PRICE_CACHE, code, _fetch_stock_price)
+
+
+def peek_stock_price(code=STOCK_CODE, max_age=PRICE_CACHE_TTL):
+    """max_age초 이내에 끝난 주가 조회 결과 (없으면 None, 네트워크 요청 없음)"""
+    cached = _PRICE_CACHE.get(code)
+    if not cached or time.monotonic() - cached[0] >= max_age:
+        return None
+    task = cached[1]
+    if not task.done() or task.cancelled() or task.exception() is not None:
+        return None
+    return task.result()
+
+
+async def _fetch_stock_price(code):
+    """네이버 금융에서 주가 정보 가져오기"""
+    try:
+        # 기본 정보 API + 통합 정보 API (시가, 고가, 저가, 거래량) 동시 요청
+        basic_data, integ_data = await _gather_or_cancel(
+            _get_json(naver_api_url(code, 'basic')),
+            _get_json(naver_api_url(code, 'integration'))
+        )
+
+        current_price = _num(basic_data.get('closePrice'))
+        prev_diff = _num(basic_data.get('compareToPreviousClosePrice'))
+        prev_close = current_price - prev_diff
+        if current_price <= 0 or prev_close <= 0:
+            # 가격 필드가 비어 있으면 실패 처리 (0원 기준 변동 알림/0으로 나누기 방지)
+            logger.warning("주가 조회: 현재가/전일가 없음 (%s)", code)
+            return None
+        change_rate = _num(basic_data.get('fluctuationsRatio'), float)
 
         total_infos = {item['code']: item['value'] for item in integ_data.get('totalInfos', [])}
 
-        open_price = int(total_infos.get('openPrice', '0').replace(',', ''))
-        high_price = int(total_infos.get('highPrice', '0').replace(',', ''))
-        low_price = int(total_infos.get('lowPrice', '0').replace(',', ''))
+        open_price = _num(total_infos.get('openPrice'))
+        if not open_price:
+            # 첫 체결 전이라 시가가 비어 있음 (시가 기준 계산/알림 기준가가 0이 되지 않도록 실패 처리)
+            logger.warning("주가 조회: 아직 시가 없음 (%s)", code)
+            return None
+        high_price = _num(total_infos.get('highPrice'))
+        low_price = _num(total_infos.get('lowPrice'))
         volume = total_infos.get('accumulatedTradingVolume', '0')
 
         return {
@@ -145,21 +518,23 @@ def get_stock_price():
             'prev_close': prev_close,
             'change_rate': change_rate,
             'volume': volume,
-            'timestamp': datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+            'market_status': basic_data.get('marketStatus'),
+            'timestamp': now_str()
         }
-    except Exception as e:
-        logger.error(f"주가 조회 실패: {e}")
+    except (httpx.HTTPError, ValueError, KeyError, TypeError, AttributeError) as e:
+        logger.error("주가 조회 실패 (%s): %s", code, e, exc_info=True)
         return None
 
 
-def get_orderbook():
-    """호가 정보 가져오기"""
+async def get_orderbook(code=STOCK_CODE):
+    """호가 정보 (짧은 시간 내 중복 조회는 캐시 공유)"""
+    return await _cached_fetch(_ORDERBOOK_CACHE, code, _fetch_orderbook)
+
+
+async def _fetch_orderbook(code):
+    """네이버 금융에서 호가 정보 가져오기"""
     try:
-        url = f"https://m.stock.naver.com/api/stock/{STOCK_CODE}/askingPrice"
-        headers = {'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'}
-        response = requests.get(url, headers=headers, timeout=10)
-        response.raise_for_status()
-        data = response.json()
+        data = await _get_json(naver_api_url(code, 'askingPrice'))
 
         sell_info = data.get('sellInfo', [])
         buy_infos = data.get('buyInfos', [])
@@ -167,53 +542,53 @@ def get_orderbook():
         return {
             'ask': sell_info[:5],
             'bid': buy_infos[:5],
-            'timestamp': datetime.now().strftime('%H:%M:%S')
+            'timestamp': now_str()[11:]
         }
-    except Exception as e:
-        logger.error(f"호가 조회 실패: {e}")
+    except (httpx.HTTPError, ValueError, KeyError, TypeError, AttributeError) as e:
+        logger.error("호가 조회 실패: %s", e, exc_info=True)
         return None
 
 
 # ============ 텔레그램 봇 핸들러 ============
 
+# 메인 메뉴 키보드 (고정이므로 한 번만 생성)
+_MAIN_KEYBOARD = InlineKeyboardMarkup([
+    [
+        InlineKeyboardButton("💰 현재가", callback_data='price'),
+        InlineKeyboardButton("📊 호가", callback_data='orderbook'),
+    ],
+    [
+        InlineKeyboardButton("📈 차트", callback_data='chart'),
+        InlineKeyboardButton("🔔 알림설정", callback_data='alert_menu'),
+    ],
+    [
+        InlineKeyboardButton("🕐 시간알림", callback_data='time_alert_menu'),
+        InlineKeyboardButton("⚙️ 내설정", callback_data='settings'),
+    ],
+    [
+        InlineKeyboardButton("❓ 도움말", callback_data='help'),
+    ],
+])
+
 def get_main_keyboard():
     """메인 메뉴 키보드"""
-    keyboard = [
-        [
-            InlineKeyboardButton("💰 현재가", callback_data='price'),
-            InlineKeyboardButton("📊 호가", callback_data='orderbook'),
-        ],
-        [
-            InlineKeyboardButton("📈 차트", callback_data='chart'),
-            InlineKeyboardButton("🔔 알림설정", callback_data='alert_menu'),
-        ],
-        [
-            InlineKeyboardButton("🕐 시간알림", callback_data='time_alert_menu'),
-            InlineKeyboardButton("⚙️ 내설정", callback_data='settings'),
-        ],
-        [
-            InlineKeyboardButton("❓ 도움말", callback_data='help'),
-        ],
-    ]
-    return InlineKeyboardMarkup(keyboard)
+    return _MAIN_KEYBOARD
 
 
-def get_alert_keyboard(user_settings):
-    """변동 알림 설정 키보드"""
+@functools.lru_cache(maxsize=16)
+def get_alert_keyboard(current_threshold, alert_enabled):
+    """변동 알림 설정 키보드 (alert_enabled가 None이면 미구독)"""
     options = [1, 2, 3, 5]
     keyboard = []
     row = []
 
-    current_threshold = user_settings.get('threshold', DEFAULT_THRESHOLD) if user_settings else DEFAULT_THRESHOLD
-
     for opt in options:
         label = f"{'✅ ' if current_threshold == opt else ''}{opt}%"
         row.append(InlineKeyboardButton(label, callback_data=f'alert_set_{opt}'))
     keyboard.append(row)
 
     # 알림 ON/OFF (개인별)
-    if user_settings:
-        alert_enabled = user_settings.get('enabled', DEFAULT_ENABLED)
+    if alert_enabled is not None:
         status = "🔔 알림 ON" if alert_enabled else "🔕 알림 OFF"
         keyboard.append([InlineKeyboardButton(status, callback_data='alert_toggle')])
         keyboard.append([InlineKeyboardButton("🔕 구독 해제", callback_data='unsubscribe')])
@@ -248,11 +623,9 @@ async def menu(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
 async def restart(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """소스 업데이트 및 재시작 (관리자 전용)"""
-    config = load_config()
-    admin_chat_id = str(config['telegram']['chat_id'])
     user_chat_id = str(update.effective_chat.id)
 
-    if user_chat_id != admin_chat_id:
+    if user_chat_id != ADMIN_ID:
         await update.message.reply_text("⛔ 권한이 없습니다.")
         return
 
@@ -260,26 +633,33 @@ async def restart(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
     try:
         script_dir = Path(__file__).parent
-        result = subprocess.run(
-            ['git', 'pull'],
+        # git pull 동안 다른 사용자 요청이 멈추지 않도록 비동기 하위 프로세스로 실행
+        proc = await asyncio.create_subprocess_exec(
+            'git', 'pull',
             cwd=script_dir,
-            capture_output=True,
-            text=True,
-            timeout=30
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE
         )
-
-        if result.returncode == 0:
-            output = result.stdout.strip() or "Already up to date."
+        try:
+            stdout, stderr = await asyncio.wait_for(proc.communicate(), timeout=30)
+        except asyncio.TimeoutError:
+            proc.kill()
+            await proc.wait()
+            await update.message.reply_text("❌ 업데이트 시간 초과 (30초)")
+            return
+
+        if proc.returncode == 0:
+            output = stdout.decode(errors='replace').strip() or "Already up to date."
             await update.message.reply_text(f"✅ 업데이트 완료:\n<code>{output}</code>\n\n🔄 재시작 중...", parse_mode='HTML')
 
             state = load_state()
-            state['restart_chat_id'] = str(update.effective_chat.id)
+            state['restart_chat_id'] = user_chat_id
             save_state(state)
 
-            await asyncio.sleep(1)
-            os._exit(0)
+            # 업데이트 처리/로그/상태 저장을 마무리하고 정상 종료 (재시작은 외부에서)
+            _SHUTDOWN.set()
         else:
-            await update.message.reply_text(f"❌ 업데이트 실패:\n<code>{result.stderr}</code>", parse_mode='HTML')
+            await update.message.reply_text(f"❌ 업데이트 실패:\n<code>{stderr.decode(errors='replace')}</code>", parse_mode='HTML')
 
     except Exception as e:
         await update.message.reply_text(f"❌ 오류: {e}")
@@ -291,103 +671,76 @@ async def button_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
     await query.answer()
 
     data = query.data
-    chat_id = str(query.from_user.id)
 
-    if data == 'price':
-        await show_price(query)
-    elif data == 'orderbook':
-        await show_orderbook(query)
-    elif data == 'chart':
-        await show_chart(query)
-    elif data == 'alert_menu':
-        await show_alert_menu(query)
-    elif data == 'time_alert_menu':
-        await show_time_alert_menu(query)
+    handler = _BUTTON_HANDLERS.get(data)
+    if handler:
+        await handler(query)
     elif data.startswith('time_toggle_'):
-        slot = data.replace('time_toggle_', '')
-        await toggle_time_alert(query, slot)
+        await toggle_time_alert(query, data[len('time_toggle_'):])
     elif data.startswith('alert_set_'):
-        threshold = int(data.split('_')[2])
-        await set_alert_threshold(query, threshold)
-    elif data == 'alert_toggle':
-        await toggle_alert(query)
-    elif data == 'subscribe':
-        await subscribe_button(query)
-    elif data == 'unsubscribe':
-        await unsubscribe_button(query)
-    elif data == 'settings':
-        await show_settings(query)
-    elif data == 'help':
-        await show_help(query)
-    elif data == 'back':
-        await query.edit_message_text(
-            "📋 메뉴를 선택하세요:",
-            reply_markup=get_main_keyboard()
-        )
+        await set_alert_threshold(query, int(data[len('alert_set_'):]))
+
+
+async def show_main_menu(query):
+    """메인 메뉴로 돌아가기"""
+    await query.edit_message_text(
+        "📋 메뉴를 선택하세요:",
+        reply_markup=get_main_keyboard()
+    )
 
 
 async def show_price(query):
     """현재가 표시"""
-    price_data = get_stock_price()
+    price_data = await get_stock_price()
     if not price_data:
         await query.message.reply_text("❌ 주가 조회 실패", reply_markup=get_main_keyboard())
         return
 
-    change = price_data['change_rate']
-    arrow = "🔺" if change >= 0 else "🔻"
-
-    message = f"""💰 <b>{STOCK_NAME} 현재가</b>
-
-<b>{format_price(price_data['current'])}원</b> {arrow} {change:+.2f}%
-
-📊 시가: {format_price(price_data['open'])}원
-📈 고가: {format_price(price_data['high'])}원
-📉 저가: {format_price(price_data['low'])}원
-📅 전일: {format_price(price_data['prev_close'])}원
-📦 거래량: {price_data['volume']}
-
-⏰ {price_data['timestamp']}"""
+    arrow = "🔺" if price_data['change_rate'] >= 0 else "🔻"
+    message = PRICE_TEMPLATE.format(arrow=arrow, **price_data)
 
     await query.message.reply_text(message, parse_mode='HTML', reply_markup=get_main_keyboard())
 
 
 async def show_orderbook(query):
     """호가 표시"""
-    orderbook = get_orderbook()
-    price_data = get_stock_price()
+    # 최근 조회한 현재가가 있으면 호가만 요청
+    price_data = peek_stock_price()
+    if price_data:
+        orderbook = await get_orderbook()
+    else:
+        orderbook, price_data = await asyncio.gather(get_orderbook(), get_stock_price())
 
     if not orderbook or not price_data:
         await query.message.reply_text("❌ 호가 조회 실패", reply_markup=get_main_keyboard())
         return
 
-    lines = [f"📊 <b>{STOCK_NAME} 호가</b>\n"]
-    lines.append("─" * 20)
-    lines.append("<b>매도호가</b>")
+    fp = format_price
+    lines = [f"📊 <b>{STOCK_NAME} 호가</b>\n", _SEP, "<b>매도호가</b>"]
+    append = lines.append
 
     for item in reversed(orderbook['ask']):
-        price = int(item.get('price', '0').replace(',', ''))
-        count = item.get('count', '0')
-        lines.append(f"🔴 {format_price(price)}원 | {count}주")
+        append(f"🔴 {fp(_num(item.get('price')))}원 | {item.get('count', '0')}주")
 
-    lines.append("─" * 20)
-    lines.append(f"<b>현재가: {format_price(price_data['current'])}원</b>")
-    lines.append("─" * 20)
-    lines.append("<b>매수호가</b>")
+    append(_SEP)
+    append(f"<b>현재가: {fp(price_data['current'])}원</b>")
+    append(_SEP)
+    append("<b>매수호가</b>")
 
     for item in orderbook['bid']:
-        price = int(item.get('price', '0').replace(',', ''))
-        count = item.get('count', '0')
-        lines.append(f"🔵 {format_price(price)}원 | {count}주")
+        append(f"🔵 {fp(_num(item.get('price')))}원 | {item.get('count', '0')}주")
 
-    lines.append("─" * 20)
-    lines.append(f"⏰ {orderbook['timestamp']}")
+    append(_SEP)
+    append(f"⏰ {orderbook['timestamp']}")
 
     await query.message.reply_text('\n'.join(lines), parse_mode='HTML', reply_markup=get_main_keyboard())
 
 
 async def show_chart(query):
     """차트 이미지 전송"""
-    chart_url = f"https://ssl.pstatic.net/imgfinance/chart/item/area/day/{STOCK_CODE}.png?sidcode={int(time.time())}"
+    # sidcode를 1분 단위로 맞춰 같은 분 안에서는 텔레그램 미리보기 캐시 재사용
+    sidcode = int(time.time()) // 60 * 60
+    chart_url = f"https://ssl.pstatic.net/imgfinance/chart/item/area/day/{STOCK_CODE}.png?sidcode={sidcode}"
 
     message = f"""📈 <b>{STOCK_NAME} 일봉 차트</b>
 
@@ -403,15 +756,12 @@ async def show_alert_menu(query):
     chat_id = str(query.from_user.id)
     user_settings = get_user_settings(chat_id)
 
-    config = load_config()
-    admin_id = str(config['telegram']['chat_id'])
-
     if user_settings:
         threshold = user_settings.get('threshold', DEFAULT_THRESHOLD)
         enabled = user_settings.get('enabled', DEFAULT_ENABLED)
         status = "켜짐 🔔" if enabled else "꺼짐 🔕"
 
-        if chat_id == admin_id:
+        if chat_id == ADMIN_ID:
             sub_status = "👑 관리자"
         else:
             sub_status = "✅ 구독 중"
@@ -424,6 +774,7 @@ async def show_alert_menu(query):
 
 원하는 변동률을 선택하세요:"""
     else:
+        threshold, enabled = DEFAULT_THRESHOLD, None
         message = f"""🔔 <b>알림 설정</b>
 
 👤 구독 상태: <b>❌ 미구독</b>
@@ -433,7 +784,7 @@ async def show_alert_menu(query):
     await query.edit_message_text(
         message,
         parse_mode='HTML',
-        reply_markup=get_alert_keyboard(user_settings)
+        reply_markup=get_alert_keyboard(threshold, enabled)
     )
 
 
@@ -442,23 +793,23 @@ async def set_alert_threshold(query, threshold):
     chat_id = str(query.from_user.id)
     user_settings = get_user_settings(chat_id)
 
+    # 최근 조회한 현재가가 있으면 바로 기준가로, 없으면 다음 모니터링 때 설정
+    price_data = peek_stock_price(max_age=SEED_PRICE_MAX_AGE)
+    last_alert_price = price_data['current'] if price_data else None
+
     if not user_settings:
         # 구독 안 된 상태면 먼저 구독
-        price_data = get_stock_price()
         user_settings = {
             'enabled': True,
             'threshold': threshold,
-            'last_alert_price': price_data['current'] if price_data else 0
+            'last_alert_price': last_alert_price
         }
         set_user_settings(chat_id, user_settings)
-        logger.info(f"새 구독 (threshold 설정): {chat_id}")
+        logger.info("새 구독 (threshold 설정): %s", chat_id)
     else:
-        # 기존 사용자 threshold 변경
+        # 기존 사용자 threshold 변경, last_alert_price 초기화
         user_settings['threshold'] = threshold
-        # last_alert_price 초기화
-        price_data = get_stock_price()
-        if price_data:
-            user_settings['last_alert_price'] = price_data['current']
+        user_settings['last_alert_price'] = last_alert_price
         set_user_settings(chat_id, user_settings)
 
     await show_alert_menu(query)
@@ -483,14 +834,14 @@ async def subscribe_button(query):
 
     user_settings = get_user_settings(chat_id)
     if not user_settings:
-        price_data = get_stock_price()
+        # 기준가는 다음 모니터링 때 현재가로 설정
         user_settings = {
             'enabled': True,
             'threshold': DEFAULT_THRESHOLD,
-            'last_alert_price': price_data['current'] if price_data else 0
+            'last_alert_price': None
         }
         set_user_settings(chat_id, user_settings)
-        logger.info(f"새 구독자: {chat_id} ({user_name})")
+        logger.info("새 구독자: %s (%s)", chat_id, user_name)
 
     await show_alert_menu(query)
 
@@ -498,11 +849,9 @@ async def subscribe_button(query):
 async def unsubscribe_button(query):
     """버튼으로 알림 구독 해제"""
     chat_id = str(query.from_user.id)
-    config = load_config()
-    admin_id = str(config['telegram']['chat_id'])
 
     # 관리자는 구독 해제 불가
-    if chat_id == admin_id:
+    if chat_id == ADMIN_ID:
         await query.edit_message_text(
             "👑 관리자는 구독 해제할 수 없습니다.",
             reply_markup=get_main_keyboard()
@@ -510,7 +859,7 @@ async def unsubscribe_button(query):
         return
 
     remove_user(chat_id)
-    logger.info(f"구독 해제: {chat_id}")
+    logger.info("구독 해제: %s", chat_id)
 
     await query.edit_message_text(
         "🔕 알림 구독이 해제되었습니다.\n\n다시 구독하려면 🔔 알림설정에서 구독하세요.",
@@ -522,15 +871,13 @@ async def show_settings(query):
     """개인 설정 표시"""
     chat_id = str(query.from_user.id)
     user_settings = get_user_settings(chat_id)
-    config = load_config()
-    admin_id = str(config['telegram']['chat_id'])
 
     if user_settings:
         threshold = user_settings.get('threshold', DEFAULT_THRESHOLD)
         enabled = user_settings.get('enabled', DEFAULT_ENABLED)
-        last_alert = user_settings.get('last_alert_price', '-')
+        last_alert = user_settings.get('last_alert_price') or '-'
 
-        if chat_id == admin_id:
+        if chat_id == ADMIN_ID:
             role = "👑 관리자"
         else:
             role = "👤 구독자"
@@ -653,7 +1000,7 @@ async def show_help(query):
 
 <b>자동 알림</b>
 • 09:05 - 장 시작가 알림
-• 15:30 - 장 마감 종가 알림
+• 15:31 이후 (동시호가 반영 후) - 장 마감 종가 알림
 • 설정한 % 변동 시 즉시 알림
 
 ※ 모든 설정은 개인별로 적용됩니다."""
@@ -661,55 +1008,76 @@ async def show_help(query):
     await query.edit_message_text(message, parse_mode='HTML', reply_markup=get_main_keyboard())
 
 
+# 고정 callback_data → 처리 함수 (time_toggle_*, alert_set_*는 button_callback에서 처리)
+_BUTTON_HANDLERS = {
+    'price': show_price,
+    'orderbook': show_orderbook,
+    'chart': show_chart,
+    'alert_menu': show_alert_menu,
+    'time_alert_menu': show_time_alert_menu,
+    'alert_toggle': toggle_alert,
+    'subscribe': subscribe_button,
+    'unsubscribe': unsubscribe_button,
+    'settings': show_settings,
+    'help': show_help,
+    'back': show_main_menu,
+}
+
+
 # ============ 주가 모니터링 ============
 
 async def send_to_user(app, chat_id, message):
-    """개별 사용자에게 메시지 전송"""
-    try:
-        await app.bot.send_message(
-            chat_id=chat_id,
-            text=message,
-            parse_mode='HTML',
-            reply_markup=get_main_keyboard()
-        )
-        return True
-    except Exception as e:
-        logger.error(f"전송 실패 ({chat_id}): {e}")
-        return False
+    """개별 사용자에게 메시지 전송 (전송 제한 시 한 번 재시도)"""
+    async with _SEND_SEMAPHORE:
+        for attempt in range(2):
+            try:
+                await app.bot.send_message(
+                    chat_id=chat_id,
+                    text=message,
+                    parse_mode='HTML',
+                    reply_markup=get_main_keyboard(),
+                    disable_web_page_preview=True
+                )
+                return True
+            except RetryAfter as e:
+                if attempt:
+                    logger.error("전송 실패 (%s): %s", chat_id, e)
+                    return False
+                retry_after = e.retry_after
+                if isinstance(retry_after, timedelta):
+                    retry_after = retry_after.total_seconds()
+                logger.warning("전송 제한 (%s): %s초 후 재시도", chat_id, retry_after)
+                await asyncio.sleep(retry_after)
+            except Exception as e:
+                logger.error("전송 실패 (%s): %s", chat_id, e)
+                return False
 
 
 async def send_to_all_active(app, message):
-    """모든 활성 사용자에게 전송 (시작가/종가용)"""
-    config = load_config()
-    admin_id = str(config['telegram']['chat_id'])
+    """모든 활성 사용자에게 전송 (시작가/종가용, 관리자는 시작 시 users에 등록됨)"""
     users = get_all_users()
 
-    # 관리자 포함
-    all_chat_ids = set(users.keys())
-    all_chat_ids.add(admin_id)
-
-    sent_count = 0
-    for chat_id in all_chat_ids:
-        user_settings = users.get(chat_id, {'enabled': True})
-        if user_settings.get('enabled', True):
-            if await send_to_user(app, chat_id, message):
-                sent_count += 1
+    # 동시에 전송
+    results = await asyncio.gather(
+        *(send_to_user(app, chat_id, message) for chat_id, settings in users.items()
+          if settings.get('enabled', True)),
+        return_exceptions=True
+    )
+    sent_count = sum(1 for r in results if r is True)
 
-    logger.info(f"알림 전송: {sent_count}명")
+    logger.info("알림 전송: %s명", sent_count)
 
 
 async def send_time_alert(app, slot, message):
     """특정 시간 슬롯을 구독한 사용자에게 전송"""
     users = get_all_users()
-    sent_count = 0
-    for chat_id, settings in users.items():
-        if not settings.get('enabled', True):
-            continue
-        alert_times = settings.get('alert_times', [])
-        if slot in alert_times:
-            if await send_to_user(app, chat_id, message):
-                sent_count += 1
-    logger.info(f"시간알림 [{slot}] 전송: {sent_count}명")
+    results = await asyncio.gather(
+        *(send_to_user(app, chat_id, message) for chat_id, settings in users.items()
+          if settings.get('enabled', True) and slot in settings.get('alert_times', [])),
+        return_exceptions=True
+    )
+    sent_count = sum(1 for r in results if r is True)
+    logger.info("시간알림 [%s] 전송: %s명", slot, sent_count)
 
 
 async def price_monitor(app):
@@ -719,138 +1087,156 @@ async def price_monitor(app):
     while True:
         try:
             now = datetime.now()
+            hour, minute = now.hour, now.minute
 
-            # 평일 장중에만 체크
-            if now.weekday() < 5 and 9 <= now.hour < 16:
-                state = load_state()
-                price_data = get_stock_price()
-
-                if price_data:
-                    today = now.strftime('%Y-%m-%d')
-                    current_price = price_data['current']
-                    open_price = price_data['open']
-
-                    # 오늘 첫 조회
-                    if state.get('last_date') != today:
-                        state['last_date'] = today
-                        state['open_price'] = open_price
-                        state['sent_open_alert'] = False
-                        state['sent_close_alert'] = False
-                        state['sent_time_alerts'] = []
-                        # 모든 사용자의 last_alert_price 초기화
-                        for chat_id in state.get('users', {}):
-                            state['users'][chat_id]['last_alert_price'] = open_price
-                        save_state(state)
-
-                    # 시작가 알림 (09:05)
-                    if not state.get('sent_open_alert') and now.hour == 9 and now.minute >= 5:
-                        change = ((open_price - price_data['prev_close']) / price_data['prev_close']) * 100
-                        arrow = "🔺" if change >= 0 else "🔻"
-
-                        message = f"""📊 <b>{STOCK_NAME} 장 시작</b>
-
-🔔 시작가: {format_price(open_price)}원
-📈 전일대비: {arrow} {change:+.2f}%
-⏰ {now.strftime('%Y-%m-%d %H:%M')}"""
-
-                        await send_to_all_active(app, message)
-                        state['sent_open_alert'] = True
-                        save_state(state)
-
-                    # 시간대별 알림 (개인별 설정)
-                    sent_time_alerts = state.get('sent_time_alerts', [])
-                    for slot in TIME_SLOTS:
-                        if slot in sent_time_alerts:
-                            continue
-                        slot_hour, slot_min = map(int, slot.split(':'))
-                        if now.hour > slot_hour or (now.hour == slot_hour and now.minute >= slot_min):
-                            # 이 시간대를 구독한 사용자들에게 전송
-                            change_from_open = ((current_price - open_price) / open_price) * 100
-                            arrow = "🔺" if change_from_open >= 0 else "🔻"
-
-                            message = f"""🕐 <b>{STOCK_NAME} {slot} 현재가</b>
-
-💰 현재가: {format_price(current_price)}원
-{arrow} 시가대비: {change_from_open:+.2f}%
-
-📊 시가: {format_price(open_price)}원
-📈 고가: {format_price(price_data['high'])}원
-📉 저가: {format_price(price_data['low'])}원
-
-⏰ {now.strftime('%H:%M')}"""
-
-                            await send_time_alert(app, slot, message)
-                            sent_time_alerts.append(slot)
-                            state['sent_time_alerts'] = sent_time_alerts
-                            save_state(state)
+            # 모니터링 시간 외에는 네이버 조회 없이 다음 장 시작까지 대기
+            if not is_monitoring_time(now):
+                await asyncio.sleep(seconds_until_market_open(now))
+                continue
 
-                    # 변동 알림 (개인별 threshold 적용)
-                    admin_id = str(config['telegram']['chat_id'])
-                    users = state.get('users', {})
-
-                    # 관리자도 체크 (users에 없으면 기본값)
-                    all_check_ids = set(users.keys())
-                    all_check_ids.add(admin_id)
-
-                    for chat_id in all_check_ids:
-                        user_settings = users.get(chat_id, {
-                            'enabled': True,
-                            'threshold': DEFAULT_THRESHOLD,
-                            'last_alert_price': open_price
-                        })
-
-                        if not user_settings.get('enabled', True):
-                            continue
-
-                        threshold = user_settings.get('threshold', DEFAULT_THRESHOLD)
-                        last_alert_price = user_settings.get('last_alert_price', open_price)
-
-                        if last_alert_price > 0:
-                            change = ((current_price - last_alert_price) / last_alert_price) * 100
-
-                            if abs(change) >= threshold:
-                                direction = "상승" if change > 0 else "하락"
-                                emoji = "🚀" if change > 0 else "📉"
-                                change_from_open = ((current_price - open_price) / open_price) * 100
-
-                                message = f"""{emoji} <b>{STOCK_NAME} {abs(change):.1f}% {direction}!</b>
-
-💰 현재가: {format_price(current_price)}원
-📊 시가대비: {change_from_open:+.2f}%
-📍 내 알림기준: {format_price(last_alert_price)}원
-⏰ {now.strftime('%H:%M:%S')}"""
-
-                                if await send_to_user(app, chat_id, message):
-                                    # 해당 사용자의 last_alert_price만 업데이트
-                                    if chat_id in state.get('users', {}):
-                                        state['users'][chat_id]['last_alert_price'] = current_price
-                                        save_state(state)
-
-                    # 종가 알림 (모든 활성 사용자)
-                    if not state.get('sent_close_alert') and now.hour >= 15 and now.minute >= 30:
-                        change_from_open = ((current_price - open_price) / open_price) * 100
-                        result_emoji = "📈" if change_from_open >= 0 else "📉"
-                        result_text = "상승" if change_from_open >= 0 else "하락"
-
-                        message = f"""🔔 <b>{STOCK_NAME} 장 마감</b>
-
-💰 종가: {format_price(current_price)}원
-{result_emoji} 등락: {result_text} {abs(change_from_open):.2f}%
-
-📊 시가: {format_price(open_price)}원
-📈 고가: {format_price(price_data['high'])}원
-📉 저가: {format_price(price_data['low'])}원
+            started = time.monotonic()
+            today = now.date().isoformat()
+            state = load_state()
+            sget = state.get
+            users = sget('users', {})
+
+            # 오늘 종가 알림까지 보냈으면 더 조회하지 않고 다음 장 시작까지 대기
+            if sget('last_date') == today and sget('phase') == 'closed':
+                await asyncio.sleep(seconds_until_market_open(now))
+                continue
+
+            # 알림을 받을 사용자가 없으면 (시작가/종가/변동 모두 보낼 곳이 없음) 조회 생략
+            if any(u.get('enabled', True) for u in users.values()):
+                price_data = await get_stock_price()
+            else:
+                price_data = None
+
+            if price_data:
+                dirty = False
+                current_price = price_data['current']
+                open_price = price_data['open']
+                high, low = price_data['high'], price_data['low']
+                change_from_open = (current_price - open_price) / open_price * 100
+
+                # 오늘 첫 조회
+                if sget('last_date') != today:
+                    state['last_date'] = today
+                    state['open_price'] = open_price
+                    state['phase'] = 'pre'
+                    state['sent_time_alerts'] = []
+                    # 모든 사용자의 last_alert_price 초기화
+                    for user_settings in users.values():
+                        user_settings['last_alert_price'] = open_price
+                    dirty = True
+
+                # 하루 알림 단계: pre(장 시작 전) → intraday(장중) → closed(장 마감)
+                phase = sget('phase', 'pre')
+
+                # 시작가 알림 (09:05, 10시 이후 첫 조회면 건너뜀)
+                if phase == 'pre' and (hour > 9 or minute >= 5):
+                    if hour == 9:
+                        prev_close = price_data['prev_close']
+                        change = (open_price - prev_close) / prev_close * 100
+                        arrow = "🔺" if change >= 0 else "🔻"
 
-⏰ {now.strftime('%Y-%m-%d %H:%M')}"""
+                        message = OPEN_ALERT_TEMPLATE.format(
+                            open_price=open_price, arrow=arrow, change=change, now=now
+                        )
 
                         await send_to_all_active(app, message)
-                        state['sent_close_alert'] = True
-                        save_state(state)
-
-            await asyncio.sleep(config.get('check_interval', 60))
+                    phase = state['phase'] = 'intraday'
+                    dirty = True
+
+                # 시간대별 알림 (개인별 설정)
+                sent_time_alerts = sget('sent_time_alerts', [])
+                now_hm = (hour, minute)
+                for slot, slot_time in TIME_SLOT_TIMES:
+                    if now_hm >= slot_time and slot not in sent_time_alerts:
+                        # 이 시간대를 구독한 사용자들에게 전송
+                        arrow = "🔺" if change_from_open >= 0 else "🔻"
+
+                        message = TIME_ALERT_TEMPLATE.format(
+                            slot=slot, current_price=current_price, arrow=arrow,
+                            change_from_open=change_from_open, open_price=open_price,
+                            high=high, low=low, now=now
+                        )
+
+                        await send_time_alert(app, slot, message)
+                        sent_time_alerts.append(slot)
+                        state['sent_time_alerts'] = sent_time_alerts
+                        dirty = True
+
+                # 변동 알림 (개인별 threshold 적용, 관리자는 시작 시 users에 등록됨)
+                common = VARIATION_COMMON_TEMPLATE.format(
+                    current_price=current_price, change_from_open=change_from_open
+                )
+                now_hms = now.time().isoformat('seconds')
+
+                # 전송 중 구독 변경이 있어도 안전하도록 목록 복사
+                for chat_id, user_settings in list(users.items()):
+                    if not user_settings.get('enabled', True):
+                        continue
+
+                    threshold = user_settings.get('threshold', DEFAULT_THRESHOLD)
+                    last_alert_price = user_settings.get('last_alert_price', open_price)
+
+                    # 새 구독/기준 변경 직후면 이번 현재가를 기준가로 설정
+                    if last_alert_price is None:
+                        user_settings['last_alert_price'] = current_price
+                        dirty = True
+                        continue
+
+                    if last_alert_price > 0:
+                        # |현재가 - 기준가| / 기준가 * 100 >= threshold 를 나눗셈 없이 비교
+                        diff = current_price - last_alert_price
+                        if abs(diff) * 100 >= threshold * last_alert_price:
+                            change = diff / last_alert_price * 100
+                            direction = "상승" if change > 0 else "하락"
+                            emoji = "🚀" if change > 0 else "📉"
+
+                            message = VARIATION_ALERT_TEMPLATE.format(
+                                emoji=emoji, change=abs(change), direction=direction,
+                                common=common, last_alert_price=last_alert_price, time=now_hms
+                            )
+
+                            if await send_to_user(app, chat_id, message):
+                                # 해당 사용자의 last_alert_price만 업데이트
+                                if chat_id in users:
+                                    users[chat_id]['last_alert_price'] = current_price
+                                    dirty = True
+
+                # 종가 알림 (모든 활성 사용자, 종가가 확정된 뒤)
+                if phase == 'intraday' and now_hm >= CLOSE_ALERT_TIME and (
+                    price_data['market_status'] != 'OPEN' or now_hm >= CLOSE_ALERT_DEADLINE
+                ):
+                    result_emoji = "📈" if change_from_open >= 0 else "📉"
+                    result_text = "상승" if change_from_open >= 0 else "하락"
+
+                    message = CLOSE_ALERT_TEMPLATE.format(
+                        current_price=current_price, result_emoji=result_emoji,
+                        result_text=result_text, change=abs(change_from_open),
+                        open_price=open_price, high=high, low=low, now=now
+                    )
+
+                    await send_to_all_active(app, message)
+                    state['phase'] = 'closed'
+                    dirty = True
+
+                # 변경 사항이 있을 때만 한 번 저장
+                if dirty:
+                    save_state(state)
+
+            # 처리 시간을 제외하고 check_interval 주기 유지하되,
+            # 정시 알림 시각이 먼저 오면 그 시각에 맞춰 깨어남
+            elapsed = time.monotonic() - started
+            delay = config.get('check_interval', 60) - elapsed
+            next_alert = seconds_until_next_alert(now)
+            if next_alert is not None:
+                delay = min(delay, next_alert - elapsed)
+            await asyncio.sleep(max(0, delay))
 
         except Exception as e:
-            logger.error(f"모니터링 오류: {e}")
+            logger.error("모니터링 오류: %s", e)
             await asyncio.sleep(60)
 
 
@@ -858,8 +1244,10 @@ async def price_monitor(app):
 
 async def main():
     """메인 함수"""
+    global ADMIN_ID
     config = load_config()
     token = config['telegram']['bot_token']
+    ADMIN_ID = str(config['telegram']['chat_id'])
 
     app = Application.builder().token(token).build()
 
@@ -869,10 +1257,11 @@ async def main():
     app.add_handler(CommandHandler("restart", restart))
     app.add_handler(CallbackQueryHandler(button_callback))
 
-    # 모니터링 태스크 시작
+    # 관리자 기본 설정 등록 후 모니터링 태스크 시작
+    ensure_admin_user(ADMIN_ID)
     asyncio.create_task(price_monitor(app))
 
-    logger.info(f"{STOCK_NAME} 알림봇 시작")
+    logger.info("%s 알림봇 시작", STOCK_NAME)
 
     # 재시작 완료 알림
     state = load_state()
@@ -892,27 +1281,44 @@ async def main():
                 reply_markup=get_main_keyboard()
             )
         except Exception as e:
-            logger.error(f"재시작 알림 실패: {e}")
+            logger.error("재시작 알림 실패: %s", e)
 
     # 봇 실행
     await app.initialize()
     await app.start()
-    await app.updater.start_polling()
+
+    telegram_config = config['telegram']
+    if telegram_config.get('mode') == 'webhook':
+        # 웹훅 모드: 텔레그램이 업데이트를 직접 전달 (롱폴링 요청 없음)
+        await app.updater.start_webhook(
+            listen=telegram_config.get('webhook_listen', '0.0.0.0'),
+            port=telegram_config.get('webhook_port', 8443),
+            url_path=token,
+            secret_token=telegram_config.get('webhook_secret') or None,
+            webhook_url=f"{telegram_config['webhook_url'].rstrip('/')}/{token}"
+        )
+    else:
+        await app.updater.start_polling()
 
     try:
-        while True:
-            await asyncio.sleep(1)
+        # 종료될 때까지 대기 (주기적으로 깨어나지 않음)
+        await _SHUTDOWN.wait()
     except KeyboardInterrupt:
         pass
     finally:
         await app.updater.stop()
         await app.stop()
         await app.shutdown()
+        await _HTTP.aclose()
+        flush_state()
 
 
 def run_bot():
-    """봇 실행"""
-    asyncio.run(main())
+    """봇 실행 (uvloop 설치 시 uvloop 이벤트 루프 사용)"""
+    if uvloop:
+        uvloop.run(main())
+    else:
+        asyncio.run(main())
 
 
 def test_telegram():
@@ -928,14 +1334,14 @@ def test_telegram():
 
 /start 또는 /menu 명령어로 시작하세요.
 
-⏰ {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}"""
+⏰ {now_str()}"""
 
     url = f"https://api.telegram.org/bot{token}/sendMessage"
-    response = requests.post(url, data={
+    response = _SESSION.post(url, json={
         'chat_id': chat_id,
         'text': message,
         'parse_mode': 'HTML'
-    })
+    }, timeout=10)
 
     if response.ok:
         print("✅ 텔레그램 테스트 성공!")